@@ -4,79 +4,208 @@ Quina Lottery Results Fetcher
 Scrapes winning numbers from megasena.com and updates the results.json file.
 """
 
-import json
+import atexit
+import calendar
+import functools
+import heapq
+import logging
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+import lxml.html
+from lxml import etree
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 QUINA_URL = "https://megasena.com/en/quina/results"
+QUINA_URLS = (QUINA_URL,)  # Result pages fetched on each run
+FETCH_WORKERS = 4
 DATA_FILE = Path(__file__).parent.parent / "data" / "results.json"
 MAX_RESULTS = 30  # Keep last 30 results
 
+log = logging.getLogger(__name__)
 
-def fetch_quina_results():
-    """Fetch Quina results from megasena.com"""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-    }
+# EXSLT regular expressions, used to match class attributes from XPath
+XPATH_NS = {"re": "http://exslt.org/regular-expressions"}
+
+# Shared HTML parser; comments, processing instructions and the id index
+# are never used, so libxml2 does not build them
+_HTML_PARSER = lxml.html.HTMLParser(remove_comments=True, remove_pis=True, collect_ids=False)
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset", re.IGNORECASE)
+
+# Precompiled patterns, reused for every row and div on the page
+_TABLE_XPATH = etree.XPath("//table[re:test(@class, 'results.*archive.*quina', 'i')]", namespaces=XPATH_NS)
+_ANY_TABLE_XPATH = etree.XPath("//table")
+_ROW_XPATH = etree.XPath(".//tr")
+_RESULT_DIV_XPATH = etree.XPath("//div[re:test(@class, 'result|draw', 'i')]", namespaces=XPATH_NS)
+_BALL_CLS_RE = re.compile(r"ball", re.IGNORECASE)
+_BALL_NUMBER_CLS_RE = re.compile(r"ball|number", re.IGNORECASE)
+_DRAW_RE = re.compile(r"Draw\s*(?:Number)?:?\s*(\d{4,})", re.IGNORECASE)
+_DRAW_HASH_RE = re.compile(r"#?(\d{4,})")
+_DATE_RE = re.compile(r"(\d{1,2})\s*(?:st|nd|rd|th)?\s*(\w+)\s*(\d{4})")
+
+# Month name lookup for the draw dates, replaces strptime("%d %B %Y")
+_MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7,
+    "aug": 8, "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+# Shared HTTP session so connections are pooled and reused between requests
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]),
+))
+atexit.register(_SESSION.close)
+
+
+def fetch_quina_results(url=QUINA_URL, validators=None):
+    """Fetch a Quina results page from megasena.com
+    
+    Sends a conditional GET when validators (ETag / Last-Modified) from a
+    previous fetch are given. Returns (html, encoding, validators): html is
+    the raw response body as bytes, or None if the page is unchanged (304)
+    or the request failed; encoding is the charset to decode it with, or
+    None to let lxml use the page's <meta charset>; validators is None if
+    the request failed.
+    """
+    headers = dict(HEADERS)
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("lastModified"):
+            headers["If-Modified-Since"] = validators["lastModified"]
     
     try:
-        response = requests.get(QUINA_URL, headers=headers, timeout=30)
+        response = _SESSION.get(url, headers=headers, timeout=(5, 30))
+        if response.status_code == 304:
+            return None, None, validators
         response.raise_for_status()
-        return response.text
+        new_validators = {}
+        if response.headers.get("ETag"):
+            new_validators["etag"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            new_validators["lastModified"] = response.headers["Last-Modified"]
+        # Raw bytes go straight to lxml, decoded with the page's charset
+        content = response.content
+        return content, _page_encoding(response.headers.get("Content-Type", ""), content), new_validators
     except requests.RequestException as e:
-        print(f"Error fetching page: {e}")
+        print(f"Error fetching page {url}: {e}")
+        return None, None, None
+
+
+def _page_encoding(content_type, content):
+    """Charset to parse a page with: the Content-Type header's charset if
+    given, None to let lxml read a <meta charset> declaration, else UTF-8"""
+    charset_match = _CHARSET_RE.search(content_type)
+    if charset_match:
+        return charset_match.group(1)
+    if _META_CHARSET_RE.search(content, 0, 1024):
         return None
+    return "utf-8"
+
+
+def fetch_all_pages(urls=QUINA_URLS, http_cache=None):
+    """Fetch all result pages concurrently over the shared session"""
+    http_cache = http_cache or {}
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(urls))) as executor:
+        return list(executor.map(fetch_quina_results, urls, [http_cache.get(url) for url in urls]))
 
 
-def parse_results(html_content):
+@functools.lru_cache(maxsize=None)
+def _html_parser(encoding):
+    """Shared HTML parser decoding with the given charset (None: autodetect)"""
+    if encoding is None:
+        return _HTML_PARSER
+    try:
+        return lxml.html.HTMLParser(
+            encoding=encoding, remove_comments=True, remove_pis=True, collect_ids=False
+        )
+    except LookupError:
+        # Unknown charset in the header, fall back to autodetection
+        return _HTML_PARSER
+
+
+def parse_results(html_content, encoding=None):
     """Parse the HTML to extract lottery results"""
-    soup = BeautifulSoup(html_content, "html.parser")
-    results = []
+    root = lxml.html.fromstring(html_content, parser=_html_parser(encoding))
     
-    # Find all result tables (latest and previous)
-    tables = soup.find_all("table", class_=re.compile(r"results.*archive.*quina", re.IGNORECASE))
+    # Result tables are the primary layout; only scan result cards/divs
+    # when no table rows could be parsed
+    for strategy in (_parse_via_tables, _parse_via_divs):
+        results = strategy(root)
+        if results:
+            return results
+    
+    return []
+
+
+def _parse_via_tables(root):
+    """Parse results from the result tables (latest and previous)"""
+    results = []
+    tables = _TABLE_XPATH(root)
     
     if not tables:
         # Try alternative selectors
-        tables = soup.find_all("table")
+        tables = _ANY_TABLE_XPATH(root)
     
     for table in tables:
-        rows = table.find_all("tr")
+        rows = _ROW_XPATH(table)
         
         for row in rows:
-            result = parse_result_row(row)
+            result = _parse_element(row, row.text_content(), kind="row")
             if result:
                 results.append(result)
     
-    # Also try to parse individual result cards/divs
-    result_divs = soup.find_all("div", class_=re.compile(r"result|draw", re.IGNORECASE))
+    return results
+
+
+def _parse_via_divs(root):
+    """Parse results from individual result cards/divs"""
+    results = []
+    seen = set()
     
-    for div in result_divs:
-        result = parse_result_div(div)
-        if result and result not in results:
-            # Check if this draw number already exists
-            existing_numbers = [r["drawNumber"] for r in results]
-            if result["drawNumber"] not in existing_numbers:
-                results.append(result)
+    for div in _RESULT_DIV_XPATH(root):
+        result = _parse_element(div, div.text_content(), kind="div")
+        # Skip draws already found in an earlier div
+        if result and result["drawNumber"] not in seen:
+            results.append(result)
+            seen.add(result["drawNumber"])
     
     return results
 
 
-def parse_result_row(row):
-    """Parse a table row for lottery result"""
+def _parse_element(elem, text, *, kind):
+    """Parse a table row (kind="row") or result div (kind="div") for a lottery result
+    
+    Rows take their balls from li.ball, falling back to span/div number
+    elements, and must contain exactly five. Divs take every li/span/div
+    ball or number element in one pass, skipping repeated numbers (e.g.
+    nested ball/number wrappers), and also accept a bare '#1234' draw number.
+    """
+    is_div = kind == "div"
     try:
         # Find draw number
-        draw_text = row.get_text()
-        draw_match = re.search(r"Draw\s*(?:Number)?:?\s*(\d{4,})", draw_text, re.IGNORECASE)
+        draw_match = _DRAW_RE.search(text)
+        if not draw_match and is_div:
+            draw_match = _DRAW_HASH_RE.search(text)
         
         if not draw_match:
             return None
@@ -84,38 +213,40 @@ def parse_result_row(row):
         draw_number = int(draw_match.group(1))
         
         # Find numbers (lottery balls)
-        numbers = []
-        
-        # Try to find balls in list items
-        balls = row.find_all("li", class_=re.compile(r"ball", re.IGNORECASE))
-        if balls:
-            for ball in balls:
-                num_text = ball.get_text().strip()
-                if num_text.isdigit():
-                    numbers.append(int(num_text))
-        
-        # If no balls found, try to find numbers in spans or divs
-        if not numbers:
-            num_elements = row.find_all(["span", "div"], class_=re.compile(r"number|ball", re.IGNORECASE))
-            for elem in num_elements:
-                num_text = elem.get_text().strip()
-                if num_text.isdigit() and 1 <= int(num_text) <= 80:
-                    numbers.append(int(num_text))
+        if is_div:
+            balls = (
+                ball for ball in elem.iterdescendants("li", "span", "div")
+                if _BALL_NUMBER_CLS_RE.search(ball.get("class", ""))
+            )
+            numbers = _collect_numbers(balls, dedupe=True)
+        else:
+            # Prefer list items, fall back to span/div number elements
+            balls = (
+                ball for ball in elem.iterdescendants("li")
+                if _BALL_CLS_RE.search(ball.get("class", ""))
+            )
+            numbers = _collect_numbers(balls, dedupe=False)
+            if not numbers:
+                balls = (
+                    ball for ball in elem.iterdescendants("span", "div")
+                    if _BALL_NUMBER_CLS_RE.search(ball.get("class", ""))
+                )
+                numbers = _collect_numbers(balls, dedupe=False)
         
         if len(numbers) != 5:
             return None
         
         # Find date
-        date_match = re.search(r"(\d{1,2})\s*(?:st|nd|rd|th)?\s*(\w+)\s*(\d{4})", draw_text)
+        date = None
+        date_match = _DATE_RE.search(text)
         if date_match:
             day, month, year = date_match.groups()
-            date_str = f"{day} {month} {year}"
-            try:
-                date_obj = datetime.strptime(date_str, "%d %B %Y")
-                date = date_obj.strftime("%Y-%m-%d")
-            except ValueError:
-                date = datetime.now().strftime("%Y-%m-%d")
-        else:
+            day, year = int(day), int(year)
+            month_num = _MONTHS.get(month.lower())
+            # Reject impossible dates such as 31 February
+            if month_num and 1 <= day <= calendar.monthrange(year, month_num)[1]:
+                date = f"{year:04d}-{month_num:02d}-{day:02d}"
+        if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
         
         return {
@@ -124,71 +255,60 @@ def parse_result_row(row):
             "numbers": sorted(numbers)
         }
         
-    except Exception as e:
-        print(f"Error parsing row: {e}")
+    except Exception:
+        # Debug-level so malformed pages don't flood output from the parse loop
+        log.debug("Error parsing %s", elem.tag, exc_info=True)
         return None
 
 
-def parse_result_div(div):
-    """Parse a div element for lottery result"""
+def _collect_numbers(balls, *, dedupe):
+    """Collect ball numbers, stopping as soon as there are too many"""
+    numbers = []
+    for ball in balls:
+        # Balls are normally leaf elements, so read their text directly
+        # and only walk the subtree when there is nested markup
+        num = _to_lottery_num(ball.text_content() if len(ball) else ball.text or "")
+        if num is not None and not (dedupe and num in numbers):
+            numbers.append(num)
+            # A sixth number already rules the element out
+            if len(numbers) > 5:
+                break
+    return numbers
+
+
+def _to_lottery_num(text):
+    """Convert ball text to a Quina number (1-80), or None if it is not one"""
+    text = text.strip()
+    if not text or len(text) > 2:
+        return None
     try:
-        text = div.get_text()
-        
-        # Find draw number
-        draw_match = re.search(r"Draw\s*(?:Number)?:?\s*(\d{4,})", text, re.IGNORECASE)
-        if not draw_match:
-            draw_match = re.search(r"#?(\d{4,})", text)
-        
-        if not draw_match:
-            return None
-            
-        draw_number = int(draw_match.group(1))
-        
-        # Find numbers
-        numbers = []
-        balls = div.find_all(["li", "span", "div"], class_=re.compile(r"ball|number", re.IGNORECASE))
-        
-        for ball in balls:
-            num_text = ball.get_text().strip()
-            if num_text.isdigit():
-                num = int(num_text)
-                if 1 <= num <= 80 and num not in numbers:
-                    numbers.append(num)
-        
-        if len(numbers) != 5:
-            return None
-        
-        # Find date
-        date_match = re.search(r"(\d{1,2})\s*(?:st|nd|rd|th)?\s*(\w+)\s*(\d{4})", text)
-        if date_match:
-            day, month, year = date_match.groups()
-            date_str = f"{day} {month} {year}"
-            try:
-                date_obj = datetime.strptime(date_str, "%d %B %Y")
-                date = date_obj.strftime("%Y-%m-%d")
-            except ValueError:
-                date = datetime.now().strftime("%Y-%m-%d")
-        else:
-            date = datetime.now().strftime("%Y-%m-%d")
-        
-        return {
-            "drawNumber": draw_number,
-            "date": date,
-            "numbers": sorted(numbers)
-        }
-        
-    except Exception as e:
-        print(f"Error parsing div: {e}")
+        num = int(text)
+    except ValueError:
         return None
+    return num if 1 <= num <= 80 else None
+
+
+@functools.lru_cache(maxsize=1)
+def _read_data_file(mtime_ns, size):
+    """Read DATA_FILE's bytes; the arguments only key the cache
+    
+    Errors propagate (and are not cached), so a failed read is retried and
+    reported on every call.
+    """
+    return DATA_FILE.read_bytes()
 
 
 def load_existing_data():
-    """Load existing results from JSON file"""
+    """Load existing results from JSON file, re-reading it only when it changed
+    
+    Only the raw bytes are cached; each call parses a fresh dict, so callers
+    may modify the result freely.
+    """
     if DATA_FILE.exists():
         try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
+            stat = DATA_FILE.stat()
+            return orjson.loads(_read_data_file(stat.st_mtime_ns, stat.st_size))
+        except (orjson.JSONDecodeError, IOError) as e:
             print(f"Error loading existing data: {e}")
     
     return {
@@ -203,17 +323,13 @@ def merge_results(existing_results, new_results):
     existing_draws = {r["drawNumber"]: r for r in existing_results}
     
     for result in new_results:
-        draw_num = result["drawNumber"]
-        if draw_num not in existing_draws:
-            existing_draws[draw_num] = result
-        else:
-            # Update if numbers are different (correction)
-            if existing_draws[draw_num]["numbers"] != result["numbers"]:
-                existing_draws[draw_num] = result
+        current = existing_draws.get(result["drawNumber"])
+        # Add new draws, update existing ones if numbers are different (correction)
+        if current is None or current["numbers"] != result["numbers"]:
+            existing_draws[result["drawNumber"]] = result
     
-    # Sort by draw number descending and limit
-    merged = sorted(existing_draws.values(), key=lambda x: x["drawNumber"], reverse=True)
-    return merged[:MAX_RESULTS]
+    # Keep the latest draws, by draw number descending
+    return heapq.nlargest(MAX_RESULTS, existing_draws.values(), key=lambda x: x["drawNumber"])
 
 
 def save_results(data):
@@ -221,36 +337,53 @@ def save_results(data):
     # Ensure directory exists
     DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    DATA_FILE.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    _read_data_file.cache_clear()
     
     print(f"Saved {len(data['results'])} results to {DATA_FILE}")
 
 
 def main():
     """Main function"""
+    logging.basicConfig(level=logging.INFO)
     print("=" * 50)
     print("Quina Results Fetcher")
     print("=" * 50)
-    print(f"Fetching results from: {QUINA_URL}")
+    print(f"Fetching results from: {', '.join(QUINA_URLS)}")
     
-    # Fetch HTML
-    html_content = fetch_quina_results()
+    # Load existing data
+    existing_data = load_existing_data()
+    existing_results = existing_data.get("results", [])
+    print(f"Loaded {len(existing_results)} existing results")
+    
+    # Fetch HTML, revalidating against the cached ETag / Last-Modified
+    http_cache = existing_data.get("_http_cache", {})
+    responses = fetch_all_pages(QUINA_URLS, http_cache)
     
-    if not html_content:
+    if all(validators is None for _, _, validators in responses):
         print("Failed to fetch page content")
         sys.exit(1)
     
-    print(f"Fetched {len(html_content)} bytes of HTML")
+    pages = {url: response for url, response in zip(QUINA_URLS, responses) if response[0]}
     
-    # Parse results
-    new_results = parse_results(html_content)
-    print(f"Parsed {len(new_results)} results from page")
+    if not pages:
+        print("No changes (pages not modified since last fetch)")
+        return 0
     
-    # Load existing data
-    existing_data = load_existing_data()
-    existing_results = existing_data.get("results", [])
-    print(f"Loaded {len(existing_results)} existing results")
+    print(f"Fetched {sum(len(page) for page, _, _ in pages.values())} bytes of HTML from {len(pages)} page(s)")
+    
+    # Parse results. Validators are only kept for pages that yielded
+    # results, so a page that parsed to nothing is fetched in full again
+    http_cache = dict(http_cache)
+    new_results = []
+    for url, (page, encoding, validators) in pages.items():
+        page_results = parse_results(page, encoding)
+        new_results.extend(page_results)
+        if page_results:
+            http_cache[url] = validators
+        else:
+            http_cache.pop(url, None)
+    print(f"Parsed {len(new_results)} results from {len(pages)} page(s)")
     
     # Merge results
     merged_results = merge_results(existing_results, new_results)
@@ -269,7 +402,8 @@ def main():
     data = {
         "lastUpdated": datetime.utcnow().isoformat() + "Z",
         "source": "megasena.com",
-        "results": merged_results
+        "results": merged_results,
+        "_http_cache": http_cache
     }
     
     # Save results
@@ -0,0 +1,93 @@
+"""Regression checks for the Quina results parser, using small HTML fixtures"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import fetch_quina  # noqa: E402
+
+
+def balls(tag, cls, numbers):
+    return "".join(f'<{tag} class="{cls}">{n}</{tag}>' for n in numbers)
+
+
+def table(cells):
+    return f'<html><body><table class="results archive quina"><tr>{cells}</tr></table></body></html>'
+
+
+def div(content):
+    return f'<html><body><div class="draw-card">{content}</div></body></html>'
+
+
+def test_row_with_li_balls():
+    html = table(f"<td>Draw Number: 6954 14th February 2026</td><td><ul>{balls('li', 'ball', [78, 2, 29, 34, 44])}</ul></td>")
+    assert fetch_quina.parse_results(html) == [
+        {"drawNumber": 6954, "date": "2026-02-14", "numbers": [2, 29, 34, 44, 78]}
+    ]
+
+
+def test_row_falls_back_to_span_numbers():
+    html = table(f"<td>Draw 6953 13 February 2026</td><td>{balls('span', 'number', [7, 22, 35, 58, 63])}</td>")
+    assert fetch_quina.parse_results(html)[0]["numbers"] == [7, 22, 35, 58, 63]
+
+
+def test_row_rejects_six_balls_with_a_repeat():
+    html = table(f"<td>Draw 6952 12 February 2026</td><td><ul>{balls('li', 'ball', [2, 2, 34, 44, 78, 9])}</ul></td>")
+    assert fetch_quina.parse_results(html) == []
+
+
+def test_row_fallback_ignores_li_numbers():
+    html = table(f"<td>Draw 6951 11 February 2026</td><td><ul>{balls('li', 'number', [1, 2, 3, 4, 5])}</ul></td>")
+    assert fetch_quina.parse_results(html) == []
+
+
+def test_div_collects_mixed_ball_and_number_elements():
+    html = div(f"Draw 6948 8 January 2026<ul>{balls('li', 'ball', [10, 11])}</ul>{balls('span', 'number', [12, 13, 14])}")
+    assert fetch_quina.parse_results(html) == [
+        {"drawNumber": 6948, "date": "2026-01-08", "numbers": [10, 11, 12, 13, 14]}
+    ]
+
+
+def test_div_skips_repeated_numbers_and_accepts_hash_draw():
+    html = div(f"#6947 7 January 2026{balls('span', 'ball', [9, 9, 8, 7, 6, 5])}")
+    assert fetch_quina.parse_results(html)[0]["numbers"] == [5, 6, 7, 8, 9]
+
+
+def test_impossible_date_falls_back_to_today():
+    html = table(f"<td>Draw 6946 31st February 2026</td><td><ul>{balls('li', 'ball', [1, 2, 3, 4, 5])}</ul></td>")
+    assert fetch_quina.parse_results(html)[0]["date"] != "2026-02-31"
+
+
+def test_page_encoding_prefers_header_then_meta_then_utf8():
+    assert fetch_quina._page_encoding("text/html; charset=ISO-8859-1", b"") == "ISO-8859-1"
+    assert fetch_quina._page_encoding("text/html", b'<head><meta charset="utf-8"></head>') is None
+    assert fetch_quina._page_encoding("text/html", b"<head><script>var charset=1;</script></head>") == "utf-8"
+
+
+def test_page_without_charset_declaration_decodes_as_utf8():
+    page = "<html><head><script>var charset=1;</script></head><body><p>São Paulo</p></body></html>".encode()
+    encoding = fetch_quina._page_encoding("text/html", page)
+    root = fetch_quina.lxml.html.fromstring(page, parser=fetch_quina._html_parser(encoding))
+    assert root.xpath("//p")[0].text == "São Paulo"
+
+
+def test_load_existing_data_returns_independent_copies(tmp_path, monkeypatch):
+    data_file = tmp_path / "results.json"
+    data_file.write_bytes(b'{"lastUpdated": null, "source": "megasena.com", "results": []}')
+    monkeypatch.setattr(fetch_quina, "DATA_FILE", data_file)
+    fetch_quina._read_data_file.cache_clear()
+
+    fetch_quina.load_existing_data()["results"].append({"drawNumber": 1})
+    assert fetch_quina.load_existing_data()["results"] == []
+
+
+def test_load_existing_data_reports_corrupt_file_every_time(tmp_path, monkeypatch, capsys):
+    data_file = tmp_path / "results.json"
+    data_file.write_bytes(b"{not json")
+    monkeypatch.setattr(fetch_quina, "DATA_FILE", data_file)
+    fetch_quina._read_data_file.cache_clear()
+
+    for _ in range(2):
+        assert fetch_quina.load_existing_data()["results"] == []
+        assert "Error loading existing data" in capsys.readouterr().out